@@ -1,9 +1,20 @@
+import copy
+import heapq
 import json
+import sys
+from functools import lru_cache
+from itertools import chain
+from operator import itemgetter
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass, field
 
+try:
+    import orjson  # 可选依赖，读写更快；未安装时回退到标准库 json
+except ImportError:
+    orjson = None
 
-@dataclass
+
+@dataclass(slots=True)
 class Operator:
     id: str
     name: str
@@ -14,13 +25,13 @@ class Operator:
     rarity: int
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class RoomRequirement:
     operator: str
     elite_required: int
 
 
-@dataclass
+@dataclass(slots=True)
 class OperatorEfficiency:
     operators: List[str]
     workplace_type: str
@@ -36,9 +47,23 @@ class OperatorEfficiency:
     apply_each: bool = False
     priority: int = 0
     products: List[str] = field(default_factory=list)
-
-
-@dataclass
+    system_name: str = "通用"  # 规则所属体系，加载时确定
+    slot_efficiency: float = 0.0  # 人均效率，由 WorkplaceOptimizer 在效率确定后计算
+    operators_set: frozenset = field(init=False, repr=False, compare=False)  # operators 的集合形式，用于成员判断
+    # 以下仅取决于干员库存，加载后由 WorkplaceOptimizer 预先计算
+    requirements_satisfied: bool = True  # 站点需求（中枢/宿舍/发电站/办公室）是否满足
+    operators_owned: bool = True  # 组合内干员是否全部拥有
+    elite_satisfied: bool = True  # 组合内干员是否满足精英化要求
+    owned_operators: tuple = ()  # 已拥有的干员（保持原顺序）
+    eligible_operators: tuple = ()  # 已拥有且满足该干员精英要求的干员，apply_each 规则只需逐个评估这些干员
+    # 各干员在本规则中的每日上班次数上限，随菲亚梅塔目标更新
+    usage_caps: Dict[str, int] = field(default_factory=dict, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.operators_set = frozenset(self.operators)
+
+
+@dataclass(slots=True)
 class Workplace:
     id: str
     name: str
@@ -46,9 +71,10 @@ class Workplace:
     base_efficiency: float
     products: List[str] = field(default_factory=list)  # 保留，支持验证
     current_product: str = ""  # 新增，当前班次产物
+    workplace_type: str = ""  # 对应效率规则中的站点类型，创建时确定
 
 
-@dataclass
+@dataclass(slots=True)
 class AssignmentResult:
     workplace: Workplace
     optimal_operators: List[Operator]
@@ -61,6 +87,88 @@ class AssignmentResult:
     hire_requirements: List[RoomRequirement]
 
 
+@lru_cache(maxsize=512)
+def parse_operator_string(op_str: str) -> tuple[str, int]:
+    """解析 "干员名/精英等级" 格式的字符串，未写等级时视为精0"""
+    name, sep, elite_str = op_str.partition('/')
+    return sys.intern(name.strip()), int(elite_str) if sep else 0
+
+
+@lru_cache(maxsize=None)
+def _room_requirement(operator: str, elite_required: int) -> RoomRequirement:
+    """相同的 (干员, 精英等级) 需求在各规则间共享同一个不可变实例"""
+    return RoomRequirement(operator=operator, elite_required=elite_required)
+
+
+def _parse_room_reqs(rule_data: Dict[str, Any], key: str) -> List[RoomRequirement]:
+    """解析规则中某个站点（control_center/dormitory/power_station/hire）的需求列表"""
+    return [_room_requirement(*parse_operator_string(op_str)) for op_str in rule_data.get(key, ())]
+
+
+@lru_cache(maxsize=8)
+def _expand_products(requirements: tuple) -> tuple:
+    """将 ((产物, 数量), ...) 展开为按顺序排列的产物元组"""
+    products = []
+    for product, count in requirements:
+        products.extend([product] * count)
+    return tuple(products)
+
+
+def _usage_exhausted(rule: OperatorEfficiency, operator_usage: Dict[str, int]) -> bool:
+    """规则中是否有干员已达到每日上班次数上限"""
+    caps = rule.usage_caps
+    for op_name in rule.operators:
+        if operator_usage[op_name] >= caps[op_name]:
+            return True
+    return False
+
+
+def _dominates(better: OperatorEfficiency, rule: OperatorEfficiency) -> bool:
+    """按人均效率排序后位于前面的 better 是否支配 rule：
+    rule 可用时 better 必然可用（干员为其子集、槽位不多于 rule、自动化限制下同样放行），
+    而 better 人均效率不低于 rule，因此 rule 永远不会被严格优先选中"""
+    if better.apply_each or rule.apply_each or len(better.operators) > len(rule.operators):
+        return False
+    if not better.operators_set <= rule.operators_set:
+        return False
+    return (any('清流' in op for op in better.operators) or
+            not any('清流' in op for op in rule.operators))
+
+
+# 单个班次方案的结构模板（MAA 协议），每班深拷贝后填入班次信息与各房间干员
+_PLAN_TEMPLATE = {
+    "name": "",
+    "description": "",
+    "description_post": "",
+    "Fiammetta": {"enable": False, "target": "", "order": "pre"},
+    "rooms": {
+        "trading": [],
+        "manufacture": [],
+        "control": [{"operators": []}],  # 初始化为空
+        "power": [],
+        "meeting": [{"autofill": True}],
+        "hire": [{"operators": []}],
+        "dormitory": [{"autofill": True} for _ in range(4)],  # 初始化为自动填充
+        "processing": [{"operators": []}],
+    }
+}
+
+# 候选方案类型：体系组合 / 通用组合 / 通用单人（apply_each，按单个干员计）
+_CANDIDATE_SYSTEM = 0
+_CANDIDATE_GENERIC = 1
+_CANDIDATE_EACH = 2
+
+
+@dataclass(slots=True)
+class _Candidate:
+    """optimize_workplace 中的候选方案"""
+    kind: int
+    rule: OperatorEfficiency
+    required: List[str]
+    efficiency: float
+    slots_used: int
+
+
 class WorkplaceOptimizer:
     def __init__(self, efficiency_file: str, operator_file: str, config_file: str = None, debug: bool = False):
         # 保存文件名，便于调试输出
@@ -84,8 +192,20 @@ class WorkplaceOptimizer:
             if rule.workplace_type == 'manufacturing_station' and rule.operators == ['清流']:
                 rule.synergy_efficiency = self.trading_stations_count * 20
                 break
+        # 按站点类型索引规则，避免每次优化都扫描全部规则；同时记录人均效率
+        # （apply_each 规则按单人计算，其余按组合人数平均）
+        self.rules_by_type: Dict[str, List[OperatorEfficiency]] = {}
+        for rule in self.efficiency_rules:
+            rule.slot_efficiency = rule.synergy_efficiency if rule.apply_each else \
+                rule.synergy_efficiency / len(rule.operators)
+            self.rules_by_type.setdefault(rule.workplace_type, []).append(rule)
+        # (站点类型, 产物) -> 适用规则 / 按体系分组并排序的规则，首次使用时构建
+        self._rules_by_type_product: Dict[tuple, List[OperatorEfficiency]] = {}
+        self._rules_by_slot_efficiency: Dict[tuple, List[OperatorEfficiency]] = {}
+        self._system_groups_cache: Dict[tuple, Dict[str, List[OperatorEfficiency]]] = {}
+        self.refresh_operator_caches()
         self.workplaces = self.load_workplaces()
-        self.fiammetta_targets = []  # 修改：当前菲亚梅塔目标列表
+        self.set_fiammetta_targets([])
 
         # 如果启用调试模式，打印加载信息和摘要
         if self.debug:
@@ -96,17 +216,22 @@ class WorkplaceOptimizer:
 
     def load_json(self, file_path: str) -> Any:
         """加载JSON文件"""
-        with open(file_path, 'r', encoding='utf-8') as f:
+        with open(file_path, 'rb') as f:
             print("加载文件:", file_path)
-            return json.load(f)
+            data = f.read()
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data.decode('utf-8'))
 
     def load_operators(self) -> Dict[str, Operator]:
         """加载干员配置"""
         operators = {}
         for op_data in self.operator_data:
-            operators[op_data['name']] = Operator(
+            # 干员名在各处作为字典键和集合成员使用，驻留后比较可走身份判断的快速路径
+            name = sys.intern(op_data['name'])
+            operators[name] = Operator(
                 id=op_data['id'],
-                name=op_data['name'],
+                name=name,
                 elite=op_data['elite'],
                 level=op_data['level'],
                 own=op_data['own'],
@@ -119,13 +244,6 @@ class WorkplaceOptimizer:
     def load_efficiency_rules(self) -> List[OperatorEfficiency]:
         expanded_rules: List[OperatorEfficiency] = []
 
-        def parse_operator_string(op_str: str) -> tuple[str, int]:
-            if '/' in op_str:
-                name, elite_str = op_str.split('/', 1)
-                return name.strip(), int(elite_str.strip())
-            else:
-                return op_str.strip(), 0
-
         for workplace_type, systems in self.efficiency_data.get('combination_rules', {}).items():
             for system_name, system_data in systems.items():
                 if isinstance(system_data, list):
@@ -139,28 +257,10 @@ class WorkplaceOptimizer:
                             if elite > 0:
                                 elite_requirements[name] = elite
 
-                        control_center_reqs = []
-                        dormitory_reqs = []
-                        power_station_reqs = []
-                        hire_reqs = []
-                        if 'control_center' in rule_data:
-                            for cc_str in rule_data['control_center']:
-                                name, elite = parse_operator_string(cc_str)
-                                control_center_reqs.append(
-                                    RoomRequirement(operator=name, elite_required=elite))
-                        if 'dormitory' in rule_data:
-                            for dorm_str in rule_data['dormitory']:
-                                name, elite = parse_operator_string(dorm_str)
-                                dormitory_reqs.append(RoomRequirement(operator=name, elite_required=elite))
-                        if 'power_station' in rule_data:
-                            for pow_str in rule_data['power_station']:
-                                op_name, elite = parse_operator_string(pow_str)
-                                power_station_reqs.append(
-                                    RoomRequirement(operator=op_name, elite_required=elite))
-                        if 'hire' in rule_data:
-                            for hire_str in rule_data['hire']:
-                                op_name, elite = parse_operator_string(hire_str)
-                                hire_reqs.append(RoomRequirement(operator=op_name, elite_required=elite))
+                        control_center_reqs = _parse_room_reqs(rule_data, 'control_center')
+                        dormitory_reqs = _parse_room_reqs(rule_data, 'dormitory')
+                        power_station_reqs = _parse_room_reqs(rule_data, 'power_station')
+                        hire_reqs = _parse_room_reqs(rule_data, 'hire')
 
                         description = "通用单人" if rule_data.get('apply_each',
                                                                   False) else f"{system_name} - {', '.join(operators)}"
@@ -176,6 +276,7 @@ class WorkplaceOptimizer:
                             base_efficiency=0,
                             synergy_efficiency=rule_data['efficiency'],
                             description=description,
+                            system_name=system_name,
                             elite_requirements=elite_requirements,
                             requires_control_center=control_center_reqs,
                             requires_dormitory=dormitory_reqs,
@@ -212,28 +313,10 @@ class WorkplaceOptimizer:
                             if elite > 0:
                                 all_elite_requirements[name] = elite
 
-                        control_center_reqs = []
-                        dormitory_reqs = []
-                        power_station_reqs = []
-                        hire_reqs = []
-                        if 'control_center' in rule_data:
-                            for cc_str in rule_data['control_center']:
-                                name, elite = parse_operator_string(cc_str)
-                                control_center_reqs.append(
-                                    RoomRequirement(operator=name, elite_required=elite))
-                        if 'dormitory' in rule_data:
-                            for dorm_str in rule_data['dormitory']:
-                                name, elite = parse_operator_string(dorm_str)
-                                dormitory_reqs.append(RoomRequirement(operator=name, elite_required=elite))
-                        if 'power_station' in rule_data:
-                            for pow_str in rule_data['power_station']:
-                                op_name, elite = parse_operator_string(pow_str)
-                                power_station_reqs.append(
-                                    RoomRequirement(operator=op_name, elite_required=elite))
-                        if 'hire' in rule_data:
-                            for hire_str in rule_data['hire']:
-                                op_name, elite = parse_operator_string(hire_str)
-                                hire_reqs.append(RoomRequirement(operator=op_name, elite_required=elite))
+                        control_center_reqs = _parse_room_reqs(rule_data, 'control_center')
+                        dormitory_reqs = _parse_room_reqs(rule_data, 'dormitory')
+                        power_station_reqs = _parse_room_reqs(rule_data, 'power_station')
+                        hire_reqs = _parse_room_reqs(rule_data, 'hire')
 
                         # 合并基础和规则产物
                         rule_products = rule_data.get('product', base_products)
@@ -249,6 +332,7 @@ class WorkplaceOptimizer:
                             base_efficiency=0,
                             synergy_efficiency=rule_data['efficiency'],
                             description=description,
+                            system_name=system_name,
                             elite_requirements=all_elite_requirements,
                             requires_control_center=control_center_reqs,
                             requires_dormitory=dormitory_reqs,
@@ -288,7 +372,8 @@ class WorkplaceOptimizer:
                 id=f"trading_{i + 1}",
                 name=f"贸易站{i + 1}",
                 max_operators=default_trading['max_operators'],
-                base_efficiency=default_trading['base_efficiency']
+                base_efficiency=default_trading['base_efficiency'],
+                workplace_type='trading_station'
             ))
 
         # 动态创建制造站
@@ -297,7 +382,8 @@ class WorkplaceOptimizer:
                 id=f"manufacturing_{i + 1}",
                 name=f"制造站{i + 1}",
                 max_operators=default_manufacturing['max_operators'],
-                base_efficiency=default_manufacturing['base_efficiency']
+                base_efficiency=default_manufacturing['base_efficiency'],
+                workplace_type='manufacturing_station'
             ))
 
         # 添加会客室
@@ -306,7 +392,8 @@ class WorkplaceOptimizer:
             id=meeting_data['id'],
             name=meeting_data['name'],
             max_operators=meeting_data['max_operators'],
-            base_efficiency=meeting_data['base_efficiency']
+            base_efficiency=meeting_data['base_efficiency'],
+            workplace_type='meeting_room'
         ))
 
         # 添加发电站
@@ -316,14 +403,15 @@ class WorkplaceOptimizer:
                 id=ps_data['id'],
                 name=ps_data['name'],
                 max_operators=ps_data['max_operators'],
-                base_efficiency=ps_data['base_efficiency']
+                base_efficiency=ps_data['base_efficiency'],
+                workplace_type='power_station'
             ))
 
         return workplaces
 
     def get_available_operators(self) -> List[Operator]:
         """获取可用的干员列表（拥有的干员）"""
-        return [op for op in self.operators.values() if op.own]
+        return self._available_ops
 
     def check_elite_requirements(self, operators: List[Operator], elite_requirements: Dict[str, int]) -> bool:
         """检查干员是否满足精英化要求"""
@@ -335,87 +423,149 @@ class WorkplaceOptimizer:
                     return False
         return True
 
+    def check_elite_requirements_by_map(self, op_by_name: Dict[str, Operator],
+                                        elite_requirements: Dict[str, int]) -> bool:
+        """检查精英化要求，直接使用已有的按名索引，避免重建字典"""
+        for op_name, required_elite in elite_requirements.items():
+            op = op_by_name.get(op_name)
+            if op is not None and op.elite < required_elite:
+                return False
+        return True
+
     def check_room_requirements(self, room_reqs: List[RoomRequirement]) -> bool:
         """检查站点需求是否满足：动态判断干员是否拥有且精英等级满足"""
+        owned_elite = self._owned_elite
         for req in room_reqs:
-            if req.operator not in self.operators:
-                return False
-            op = self.operators[req.operator]
-            if not op.own or op.elite < req.elite_required:
+            if owned_elite.get(req.operator, -1) < req.elite_required:
                 return False
         return True
 
+    def refresh_operator_caches(self):
+        """根据 self.operators 重建干员相关缓存并重新判断规则可行性；干员库存变化后需调用"""
+        # 干员拥有情况在优化过程中不变，缓存可用干员及按名索引
+        self._available_ops = [op for op in self.operators.values() if op.own]
+        self._op_by_name = {op.name: op for op in self._available_ops}
+        # 干员名 -> 精英等级，未拥有的干员记为 -1，便于一次查表完成"拥有且精英等级满足"的判断
+        self._owned_elite: Dict[str, int] = {
+            name: op.elite if op.own else -1 for name, op in self.operators.items()}
+        self.precompute_rule_feasibility()
+
+    def precompute_rule_feasibility(self):
+        """预先判断每条规则的站点需求、组合干员拥有情况及精英化要求是否满足，不可行的规则不进入优化用的规则桶"""
+        for rule in self.efficiency_rules:
+            rule.owned_operators = tuple(op_name for op_name in rule.operators if op_name in self._op_by_name)
+            rule.operators_owned = len(rule.owned_operators) == len(rule.operators)
+            rule.eligible_operators = tuple(op_name for op_name in rule.owned_operators
+                                            if self._owned_elite[op_name] >= rule.elite_requirements.get(op_name, 0))
+            rule.elite_satisfied = self.check_elite_requirements_by_map(self._op_by_name, rule.elite_requirements)
+            rule.requirements_satisfied = (self.check_room_requirements(rule.requires_control_center) and
+                                           self.check_room_requirements(rule.requires_dormitory) and
+                                           self.check_room_requirements(rule.requires_power_station) and
+                                           self.check_room_requirements(rule.requires_hire))
+            if self.debug and not rule.requirements_satisfied:
+                print(f"DEBUG: 站点需求不满足，排除规则: {rule.description}")
+        # 规则桶依赖上面的判断结果，清空后按需重建
+        self._rules_by_type_product.clear()
+        self._rules_by_slot_efficiency.clear()
+        self._system_groups_cache.clear()
+
+    def set_fiammetta_targets(self, targets: List[str]):
+        """设置菲亚梅塔目标，并更新各规则中干员的上班次数上限（菲亚梅塔目标在贸易站可3班，其余2班）"""
+        self.fiammetta_targets = targets  # 修改：当前菲亚梅塔目标列表
+        fset = frozenset(targets)
+        for rule in self.efficiency_rules:
+            is_trading = rule.workplace_type == 'trading_station'
+            rule.usage_caps = {op_name: 3 if is_trading and op_name in fset else 2 for op_name in rule.operators}
+
+    def check_system_elite(self, rule: OperatorEfficiency) -> bool:
+        """体系评估时的特殊精英要求：孑0体系要求孑精0，孑12体系要求孑精1或精2"""
+        if rule.system_name == "孑0体系":
+            return '孑' in rule.operators_set and self._owned_elite.get('孑', -1) == 0
+        if rule.system_name == "孑12体系":
+            return '孑' in rule.operators_set and self._owned_elite.get('孑', -1) in (1, 2)
+        return True
+
     def check_fiammetta_available(self) -> bool:
         """检查菲亚梅塔是否可用（拥有且精二）"""
-        if '菲亚梅塔' not in self.operators:
-            return False
-        op = self.operators['菲亚梅塔']
-        return op.own and op.elite >= 2
+        return self._owned_elite.get('菲亚梅塔', -1) >= 2
+
+    def get_rules_for_product(self, workplace_type: str, product: str) -> List[OperatorEfficiency]:
+        """获取指定站点类型与产物下可用的规则，保持加载时的顺序"""
+        key = (workplace_type, product)
+        rules = self._rules_by_type_product.get(key)
+        if rules is None:
+            # 不可行的规则直接排除（apply_each 规则只需拥有其中部分干员，且只评估满足精英要求的干员）；
+            # 如果规则指定产物，则必须匹配当前产物，未指定则允许
+            rules = [r for r in self.rules_by_type.get(workplace_type, ())
+                     if r.requirements_satisfied and
+                     (r.eligible_operators if r.apply_each else r.operators_owned and r.elite_satisfied) and
+                     (not r.products or product in r.products)]
+            self._rules_by_type_product[key] = rules
+        return rules
+
+    def get_rules_by_slot_efficiency(self, workplace_type: str, product: str) -> List[OperatorEfficiency]:
+        """同 get_rules_for_product，但按人均效率降序排列（稳定排序，同效率保持加载顺序），
+        并去掉被排在前面的规则支配、不可能被选中的规则"""
+        key = (workplace_type, product)
+        rules = self._rules_by_slot_efficiency.get(key)
+        if rules is None:
+            rules = []
+            for rule in sorted(self.get_rules_for_product(workplace_type, product),
+                               key=lambda r: r.slot_efficiency, reverse=True):
+                if not any(_dominates(kept, rule) for kept in rules):
+                    rules.append(rule)
+            self._rules_by_slot_efficiency[key] = rules
+        return rules
+
+    def get_system_groups(self, workplace_type: str, product: str) -> Dict[str, List[OperatorEfficiency]]:
+        """获取指定站点类型与产物下可用的规则，按体系分组并在组内按权重排序"""
+        key = (workplace_type, product)
+        system_groups = self._system_groups_cache.get(key)
+        if system_groups is None:
+            system_groups = {}
+            for rule in self.rules_by_type.get(workplace_type, ()):
+                if rule.products and product not in rule.products:
+                    continue
+                # 体系的先后顺序决定同效率时的取舍，因此不可行的规则也要参与确定分组顺序
+                rules = system_groups.setdefault(rule.system_name, [])
+                # 只有"通用"组会逐个干员评估 apply_each 规则，其余体系均按完整组合评估
+                if rule.apply_each and rule.system_name == "通用":
+                    feasible = bool(rule.eligible_operators)
+                else:
+                    feasible = rule.operators_owned and rule.elite_satisfied and self.check_system_elite(rule)
+                if rule.requirements_satisfied and feasible:
+                    rules.append(rule)
+            for rules in system_groups.values():
+                rules.sort(key=lambda r: (r.priority, r.synergy_efficiency), reverse=True)
+            self._system_groups_cache[key] = system_groups
+        return system_groups
 
     def get_workplace_type(self, workplace: Workplace) -> str:
-        if 'trading' in workplace.id:
-            return 'trading_station'
-        elif 'manufacturing' in workplace.id:
-            return 'manufacturing_station'
-        elif 'meeting' in workplace.id:
-            return 'meeting_room'
-        elif 'power' in workplace.id:
-            return 'power_station'
-        else:
-            return workplace.id.split('_')[0] + '_station'[0] + '_station'
+        return workplace.workplace_type
 
     def optimize_workplace(self, workplace: Workplace, operator_usage: Dict[str, int],
                            shift_used_names: set) -> AssignmentResult:
         """优化单个工作站的干员配置（体系优先 + 通用替补），考虑全局干员使用限制和班次内重复限制。
 
         每个干员一天最多分配到两个班次，除菲亚梅塔目标可3班。
+        operator_usage 需包含所有已拥有干员（初始为0），进入优化的规则只涉及已拥有干员。
         """
-        available_ops = self.get_available_operators()
-        op_by_name = {op.name: op for op in available_ops}
+        op_by_name = self._op_by_name
         workplace_type = self.get_workplace_type(workplace)
 
-        # 过滤规则：如果规则指定产物，则必须匹配当前产物；未指定则允许
-        def rule_matches_products(rule: OperatorEfficiency) -> bool:
-            if not rule.products:
-                return True
-            return workplace.current_product in rule.products
-
         if self.debug:
             print(
                 f"DEBUG: 开始优化站点 {workplace.name} ({workplace.id})，站点可放: {workplace.max_operators}")
 
         remaining_slots = workplace.max_operators
         assigned_ops: List[Operator] = []
-        used_names = set()
         total_synergy = 0.0
         applied_combinations: List[str] = []
-        applied_control_center_reqs: List[RoomRequirement] = []
-        applied_dormitory_reqs: List[RoomRequirement] = []
-        applied_power_station_reqs: List[RoomRequirement] = []
-        applied_hire_reqs: List[RoomRequirement] = []
-
-        # 收集所有可用的规则（包括特定体系和通用规则）
-        all_rules = [r for r in self.efficiency_rules if
-                     r.workplace_type == workplace_type and
-                     rule_matches_products(r)]
-
-        # 按体系分组
-        system_groups = {}
-        for rule in all_rules:
-            # 确定规则所属的体系
-            system_name = "通用"
-            for sys_key in self.efficiency_data['combination_rules'].get(workplace_type, {}):
-                if sys_key in rule.description:
-                    system_name = sys_key
-                    break
-
-            if system_name not in system_groups:
-                system_groups[system_name] = []
-            system_groups[system_name].append(rule)
+        # 已应用的规则（按应用顺序），站点需求在返回结果时统一汇总
+        applied_rules: List[OperatorEfficiency] = []
 
-        # 在每个体系组内按权重排序
-        for system_name, rules in system_groups.items():
-            rules.sort(key=lambda r: (r.priority, r.synergy_efficiency), reverse=True)
+        # 收集所有可用的规则（包括特定体系和通用规则），按体系分组
+        system_groups = self.get_system_groups(workplace_type, workplace.current_product)
 
         # 评估所有可能的组合方案
         best_candidate = None
@@ -434,18 +584,12 @@ class WorkplaceOptimizer:
                 if self.debug:
                     print(f"DEBUG: 评估体系规则: {rule.description}")
 
-                # 检查干员可用性
-                unavailable_ops = []
-                for op_name in required:
-                    max_usage = 3 if op_name in self.fiammetta_targets and workplace_type == 'trading_station' else 2
-                    if (op_name not in op_by_name or
-                            op_name in used_names or
-                            op_name in shift_used_names or
-                            operator_usage.get(op_name, 0) >= max_usage):
-                        unavailable_ops.append(op_name)
-
-                if unavailable_ops:
+                # 检查干员可用性（规则桶中的组合干员均已拥有；本站已分配的干员也在 shift_used_names 中）
+                if (not rule.operators_set.isdisjoint(shift_used_names) or
+                        _usage_exhausted(rule, operator_usage)):
                     if self.debug:
+                        unavailable_ops = [op_name for op_name in required if op_name in shift_used_names or
+                                           operator_usage[op_name] >= rule.usage_caps[op_name]]
                         print(f"DEBUG:  干员不可用: {unavailable_ops}")
                     continue
 
@@ -454,59 +598,17 @@ class WorkplaceOptimizer:
                         print(f"DEBUG:  所需槽位({len(required)}) > 剩余槽位({remaining_slots})")
                     continue
 
-                op_objs = [op_by_name[op_name] for op_name in required]
-
-                # 在 op_objs 定义后进行精英检查
-                if "孑0体系" in rule.description:
-                    # 检查孑是否精0
-                    if not any(op.name == "孑" and op.elite == 0 for op in op_objs if op.name == "孑"):
-                        continue
-                elif "孑12体系" in rule.description:
-                    # 检查孑是否精1或精2
-                    if not any(op.name == "孑" and op.elite in [1, 2] for op in op_objs if op.name == "孑"):
-                        continue
-
-                if not self.check_elite_requirements(op_objs, rule.elite_requirements):
-                    if self.debug:
-                        print(f"DEBUG:  精英要求不满足: {rule.elite_requirements}")
-                    continue
-
-                if not self.check_room_requirements(rule.requires_control_center):
-                    if self.debug:
-                        cc_reqs = [f"{r.operator}(精{r.elite_required})" for r in rule.requires_control_center]
-                        print(f"DEBUG:  中枢需求不满足: {cc_reqs}")
-                    continue
-
-                # 检查宿舍需求
-                if not self.check_room_requirements(rule.requires_dormitory):
-                    if self.debug:
-                        dorm_reqs = [f"{r.operator}(精{r.elite_required})" for r in rule.requires_dormitory]
-                        print(f"DEBUG: 宿舍需求不满足({dorm_reqs})，跳过规则: {rule.description}")
-                    continue
-
-                if not self.check_room_requirements(rule.requires_power_station):
-                    if self.debug:
-                        power_reqs = [f"{r.operator}(精{r.elite_required})" for r in rule.requires_power_station]
-                        print(f"DEBUG: 发电站需求不满足({power_reqs})，跳过规则: {rule.description}")
-                    continue
-
-                if not self.check_room_requirements(rule.requires_hire):
-                    if self.debug:
-                        hire_reqs = [f"{r.operator}(精{r.elite_required})" for r in rule.requires_hire]
-                        print(f"DEBUG: 办公室需求不满足({hire_reqs})，跳过规则: {rule.description}")
-                    continue
-
                 # 计算效率（人均效率）
                 efficiency_per_slot = rule.synergy_efficiency / len(required)
                 if efficiency_per_slot > best_efficiency:
                     best_efficiency = efficiency_per_slot
-                    best_candidate = {
-                        'type': 'system',
-                        'rule': rule,
-                        'required': required,
-                        'efficiency': rule.synergy_efficiency,
-                        'slots_used': len(required)
-                    }
+                    best_candidate = _Candidate(
+                        kind=_CANDIDATE_SYSTEM,
+                        rule=rule,
+                        required=required,
+                        efficiency=rule.synergy_efficiency,
+                        slots_used=len(required)
+                    )
 
         # 评估通用规则（包括apply_each）
         generic_rules = system_groups.get("通用", [])
@@ -516,103 +618,102 @@ class WorkplaceOptimizer:
 
             if rule.apply_each:
                 # 对于apply_each规则，评估每个可用干员的效率
-                for op_name in rule.operators:
-                    max_usage = 3 if op_name in self.fiammetta_targets and workplace_type == 'trading_station' else 2
+                caps = rule.usage_caps
+                for op_name in rule.eligible_operators:
                     if (remaining_slots <= 0 or
-                            op_name in used_names or
                             op_name in shift_used_names or
-                            op_name not in op_by_name or
-                            operator_usage.get(op_name, 0) >= max_usage):
-                        continue
-
-                    op_obj = op_by_name[op_name]
-                    req_elite = {op_name: rule.elite_requirements.get(op_name, 0)}
-                    if not self.check_elite_requirements([op_obj], req_elite):
+                            operator_usage[op_name] >= caps[op_name]):
                         continue
 
                     efficiency_per_slot = rule.synergy_efficiency
                     if efficiency_per_slot > best_efficiency:
                         best_efficiency = efficiency_per_slot
-                        best_candidate = {
-                            'type': 'generic_each',
-                            'rule': rule,
-                            'required': [op_name],
-                            'efficiency': rule.synergy_efficiency,
-                            'slots_used': 1
-                        }
+                        best_candidate = _Candidate(
+                            kind=_CANDIDATE_EACH,
+                            rule=rule,
+                            required=[op_name],
+                            efficiency=rule.synergy_efficiency,
+                            slots_used=1
+                        )
             else:
                 # 对于普通通用规则
                 required = rule.operators
-                max_usage_check = lambda \
-                    op_name: 3 if op_name in self.fiammetta_targets and workplace_type == 'trading_station' else 2
-
-                if any(op_name not in op_by_name or
-                       op_name in used_names or
-                       op_name in shift_used_names or
-                       operator_usage.get(op_name, 0) >= max_usage_check(op_name)
-                       for op_name in required) or len(required) > remaining_slots:
+                if len(required) > remaining_slots:
                     continue
 
-                op_objs = [op_by_name[op_name] for op_name in required]
-                if (not self.check_elite_requirements(op_objs, rule.elite_requirements) or
-                        not self.check_room_requirements(rule.requires_control_center) or
-                        not self.check_room_requirements(rule.requires_dormitory) or
-                        not self.check_room_requirements(rule.requires_power_station) or
-                        not self.check_room_requirements(rule.requires_hire)):
+                if (not rule.operators_set.isdisjoint(shift_used_names) or
+                        _usage_exhausted(rule, operator_usage)):
                     continue
 
-                efficiency_per_slot = rule.synergy_efficiency / len(required)
+                efficiency_per_slot = rule.slot_efficiency
                 if efficiency_per_slot > best_efficiency:
                     best_efficiency = efficiency_per_slot
-                    best_candidate = {
-                        'type': 'generic',
-                        'rule': rule,
-                        'required': required,
-                        'efficiency': rule.synergy_efficiency,
-                        'slots_used': len(required)
-                    }
+                    best_candidate = _Candidate(
+                        kind=_CANDIDATE_GENERIC,
+                        rule=rule,
+                        required=required,
+                        efficiency=rule.synergy_efficiency,
+                        slots_used=len(required)
+                    )
 
         # 应用最佳候选方案
         if best_candidate and best_efficiency > 0:
-            rule = best_candidate['rule']
-            required = best_candidate['required']
+            rule = best_candidate.rule
+            required = best_candidate.required
 
+            assigned_ops.extend(op_by_name[op_name] for op_name in required)
+            shift_used_names.update(required)
             for op_name in required:
-                assigned_ops.append(op_by_name[op_name])
-                used_names.add(op_name)
-                shift_used_names.add(op_name)
                 operator_usage[op_name] += 1
 
-            remaining_slots -= best_candidate['slots_used']
-            total_synergy += best_candidate['efficiency']
+            remaining_slots -= best_candidate.slots_used
+            total_synergy += best_candidate.efficiency
 
-            if best_candidate['type'] == 'generic_each':
+            if best_candidate.kind == _CANDIDATE_EACH:
                 applied_combinations.append(f"{rule.description}({', '.join(required)})")
             else:
                 applied_combinations.append(rule.description)
 
-            applied_control_center_reqs.extend(rule.requires_control_center)
-            applied_dormitory_reqs.extend(rule.requires_dormitory)
-            applied_power_station_reqs.extend(rule.requires_power_station)
+            applied_rules.append(rule)
 
             if self.debug:
                 print(f"DEBUG: 应用最佳规则: {rule.description} -> +{rule.synergy_efficiency}%")
 
-        # 递归处理剩余槽位
-        if remaining_slots > 0:
-            # 递归调用自身处理剩余槽位
-            recursive_result = self.optimize_workplace_recursive(
-                workplace, operator_usage, shift_used_names,
-                assigned_ops, used_names, remaining_slots,
-                applied_combinations)
-
-            assigned_ops.extend(recursive_result['assigned_ops'])
-            total_synergy += recursive_result['total_synergy']
-            applied_combinations.extend(recursive_result['applied_combinations'])
-            applied_control_center_reqs.extend(recursive_result['applied_control_center_reqs'])
-            applied_dormitory_reqs.extend(recursive_result['applied_dormitory_reqs'])
-            applied_power_station_reqs.extend(recursive_result['applied_power_station_reqs'])
-            applied_hire_reqs.extend(recursive_result.get('applied_hire_reqs', []))
+        # 剩余槽位：逐轮在所有适用规则中选出人均效率最高的候选，直到放满或无可用规则
+        all_rules = self.get_rules_by_slot_efficiency(workplace_type, workplace.current_product)
+        # 首轮体系分配中已选自动化组时，剩余槽位只允许清流作为通用替补
+        automation_applied = workplace_type == 'manufacturing_station' and any(
+            '自动化' in combo for combo in applied_combinations)
+        # 首轮体系分配的规则不计入办公室（hire）需求
+        first_pass_rules = len(applied_rules)
+
+        while remaining_slots > 0:
+            # 规则已按人均效率降序排列（同效率保持加载顺序），第一个可行候选即为本轮最佳
+            best_candidate = next(self.iter_greedy_candidates(all_rules, remaining_slots, operator_usage,
+                                                              shift_used_names, automation_applied), None)
+
+            # 应用最佳候选
+            if best_candidate and best_candidate.rule.slot_efficiency > 0:
+                rule = best_candidate.rule
+                required = best_candidate.required
+
+                assigned_ops.extend(op_by_name[op_name] for op_name in required)
+                shift_used_names.update(required)
+                for op_name in required:
+                    operator_usage[op_name] += 1
+
+                remaining_slots -= best_candidate.slots_used
+                total_synergy += best_candidate.efficiency
+
+                if best_candidate.kind == _CANDIDATE_EACH:
+                    applied_combinations.append(f"{rule.description}({', '.join(required)})")
+                else:
+                    applied_combinations.append(rule.description)
+
+                applied_rules.append(rule)
+            else:
+                # 没有合适的规则，退出循环
+                break
 
         # 返回结果
         if self.debug:
@@ -625,152 +726,75 @@ class WorkplaceOptimizer:
             total_efficiency=workplace.base_efficiency + total_synergy,
             operator_efficiency=total_synergy,
             applied_combinations=applied_combinations,
-            control_center_requirements=applied_control_center_reqs,
-            dormitory_requirements=applied_dormitory_reqs,
-            power_station_requirements=applied_power_station_reqs,
-            hire_requirements=applied_hire_reqs
+            control_center_requirements=list(chain.from_iterable(r.requires_control_center for r in applied_rules)),
+            dormitory_requirements=list(chain.from_iterable(r.requires_dormitory for r in applied_rules)),
+            power_station_requirements=list(chain.from_iterable(r.requires_power_station for r in applied_rules)),
+            hire_requirements=list(chain.from_iterable(r.requires_hire for r in applied_rules[first_pass_rules:]))
         )
 
-    def optimize_workplace_recursive(self, workplace: Workplace, operator_usage: Dict[str, int],
-                                     shift_used_names: set, assigned_ops: List[Operator],
-                                     used_names: set, remaining_slots: int, applied_combinations: List[str]) -> Dict[str, Any]:
-        """递归优化工作站的剩余槽位"""
-        available_ops = self.get_available_operators()
-        op_by_name = {op.name: op for op in available_ops}
-        workplace_type = self.get_workplace_type(workplace)
-
-        total_synergy = 0.0
-        local_applied_combinations = []
-        local_applied_control_center_reqs = []
-        local_applied_dormitory_reqs = []
-        local_applied_power_station_reqs = []
-        local_applied_hire_reqs = []
-
-        # 过滤规则：如果规则指定产物，则必须匹配当前产物；未指定则允许
-        def rule_matches_products(rule: OperatorEfficiency) -> bool:
-            if not rule.products:
-                return True
-            return workplace.current_product in rule.products
-
-        while remaining_slots > 0:
-            best_candidate = None
-            best_efficiency = -1
-
-            # 评估所有可用规则
-            all_rules = [r for r in self.efficiency_rules if
-                         r.workplace_type == workplace_type and
-                         rule_matches_products(r)]
-
-            for rule in all_rules:
-                if workplace_type == 'manufacturing_station' and any(
-                        '自动化' in combo for combo in applied_combinations):
-                    # 自动化组特殊：只允许清流作为通用替补
-                    if rule.apply_each:
-                        if '清流' not in rule.operators:
-                            continue
-                    else:
-                        # 对于普通规则，如果不是清流相关，则跳过
-                        if not any('清流' in op for op in rule.operators):
-                            continue
+    def iter_greedy_candidates(self, rules: List[OperatorEfficiency], remaining_slots: int,
+                               operator_usage: Dict[str, int], shift_used_names: set,
+                               automation_applied: bool):
+        """按规则顺序逐个产出当前可行的通用候选（apply_each 规则按单个干员产出）"""
+        for rule in rules:
+            if automation_applied:
+                # 自动化组特殊：只允许清流作为通用替补
                 if rule.apply_each:
-                    # 对于apply_each规则，评估每个可用干员
-                    for op_name in rule.operators:
-                        max_usage = 3 if op_name in self.fiammetta_targets and workplace_type == 'trading_station' else 2
-                        if (op_name in used_names or
-                                op_name in shift_used_names or
-                                op_name not in op_by_name or
-                                operator_usage.get(op_name, 0) >= max_usage):
-                            continue
-
-                        op_obj = op_by_name[op_name]
-                        req_elite = {op_name: rule.elite_requirements.get(op_name, 0)}
-                        if (not self.check_elite_requirements([op_obj], req_elite) or
-                                not self.check_room_requirements(rule.requires_control_center) or
-                                not self.check_room_requirements(rule.requires_dormitory) or
-                                not self.check_room_requirements(rule.requires_power_station) or
-                                not self.check_room_requirements(rule.requires_hire)):
-                            continue
-
-                        efficiency = rule.synergy_efficiency
-                        if efficiency > best_efficiency:
-                            best_efficiency = efficiency
-                            best_candidate = {
-                                'rule': rule,
-                                'required': [op_name],
-                                'efficiency': efficiency,
-                                'slots_used': 1,
-                                'type': 'each'
-                            }
-                else:
-                    # 对于普通规则
-                    required = rule.operators
-                    if len(required) > remaining_slots:
+                    if '清流' not in rule.operators_set:
                         continue
-
-                    max_usage_check = lambda \
-                            op_name: 3 if op_name in self.fiammetta_targets and workplace_type == 'trading_station' else 2
-                    if any(op_name in used_names or
-                           op_name in shift_used_names or
-                           op_name not in op_by_name or
-                           operator_usage.get(op_name, 0) >= max_usage_check(op_name)
-                           for op_name in required):
+                else:
+                    # 对于普通规则，如果不是清流相关，则跳过
+                    if not any('清流' in op for op in rule.operators):
                         continue
-
-                    op_objs = [op_by_name[op_name] for op_name in required]
-                    if (not self.check_elite_requirements(op_objs, rule.elite_requirements) or
-                            not self.check_room_requirements(rule.requires_control_center) or
-                            not self.check_room_requirements(rule.requires_dormitory) or
-                            not self.check_room_requirements(rule.requires_power_station) or
-                            not self.check_room_requirements(rule.requires_hire)):
+            if rule.apply_each:
+                # 对于apply_each规则，评估每个可用干员
+                caps = rule.usage_caps
+                for op_name in rule.eligible_operators:
+                    if (op_name in shift_used_names or
+                            operator_usage[op_name] >= caps[op_name]):
                         continue
 
-                    efficiency_per_slot = rule.synergy_efficiency / len(required)
-                    if efficiency_per_slot > best_efficiency:
-                        best_efficiency = efficiency_per_slot
-                        best_candidate = {
-                            'rule': rule,
-                            'required': required,
-                            'efficiency': rule.synergy_efficiency,
-                            'slots_used': len(required),
-                            'type': 'normal'
-                        }
-
-            # 应用最佳候选
-            if best_candidate and best_efficiency > 0:
-                rule = best_candidate['rule']
-                required = best_candidate['required']
-
-                for op_name in required:
-                    assigned_ops.append(op_by_name[op_name])
-                    used_names.add(op_name)
-                    shift_used_names.add(op_name)
-                    operator_usage[op_name] += 1
-
-                remaining_slots -= best_candidate['slots_used']
-                total_synergy += best_candidate['efficiency']
-
-                if best_candidate['type'] == 'each':
-                    local_applied_combinations.append(f"{rule.description}({', '.join(required)})")
-                else:
-                    local_applied_combinations.append(rule.description)
-
-                local_applied_control_center_reqs.extend(rule.requires_control_center)
-                local_applied_dormitory_reqs.extend(rule.requires_dormitory)
-                local_applied_power_station_reqs.extend(rule.requires_power_station)
-                local_applied_hire_reqs.extend(rule.requires_hire)
+                    yield _Candidate(
+                        kind=_CANDIDATE_EACH,
+                        rule=rule,
+                        required=[op_name],
+                        efficiency=rule.synergy_efficiency,
+                        slots_used=1
+                    )
             else:
-                # 没有合适的规则，退出循环
-                break
+                # 对于普通规则
+                required = rule.operators
+                if len(required) > remaining_slots:
+                    continue
 
-        return {
-            'assigned_ops': [],
-            'total_synergy': total_synergy,
-            'applied_combinations': local_applied_combinations,
-            'applied_control_center_reqs': local_applied_control_center_reqs,
-            'applied_dormitory_reqs': local_applied_dormitory_reqs,
-            'applied_power_station_reqs': local_applied_power_station_reqs,
-            'applied_hire_reqs': local_applied_hire_reqs
-        }
+                if (not rule.operators_set.isdisjoint(shift_used_names) or
+                        _usage_exhausted(rule, operator_usage)):
+                    continue
+
+                yield _Candidate(
+                    kind=_CANDIDATE_GENERIC,
+                    rule=rule,
+                    required=required,
+                    efficiency=rule.synergy_efficiency,
+                    slots_used=len(required)
+                )
+
+    def absorb_room_requirements(self, result: AssignmentResult, operator_usage: Dict[str, int],
+                                 shift_used_names: set, control_operators: set, dormitory_operators: set):
+        """将站点方案所需的控制中枢、宿舍干员加入本班（班次内不重复，每日最多2班）"""
+        for reqs, room_operators in ((result.control_center_requirements, control_operators),
+                                     (result.dormitory_requirements, dormitory_operators)):
+            for req in reqs:
+                if req.operator not in shift_used_names and operator_usage[req.operator] < 2:
+                    room_operators.add(req.operator)
+                    shift_used_names.add(req.operator)
+                    operator_usage[req.operator] += 1
+
+    def assign_products(self, workplaces: List[Workplace], requirements: Dict[str, int]):
+        """按产物需求依次为站点设置产物，多余的站点不指定产物"""
+        products = _expand_products(tuple(requirements.items()))
+        for workplace, product in zip(workplaces, products + ('',) * len(workplaces)):
+            workplace.current_product = product
 
     def get_optimal_assignments(self, product_requirements: Dict[str, Dict[str, int]] = None) -> Dict[str, Any]:
         """获取最优分配方案，输出符合 MAA 协议的 JSON 格式"""
@@ -783,23 +807,13 @@ class WorkplaceOptimizer:
         fiammetta_config = self.config_data.get('Fiammetta', {"enable": False})
         fiammetta_enable = fiammetta_config.get('enable', False)
         fiammetta_available = self.check_fiammetta_available() if fiammetta_enable else False
-        self.fiammetta_targets = self.select_fiammetta_targets() if fiammetta_available else []  # 设置类属性为列表
+        self.set_fiammetta_targets(self.select_fiammetta_targets() if fiammetta_available else [])
         if fiammetta_enable and not self.fiammetta_targets:
             fiammetta_enable = False  # 无可用目标，禁用
 
-        # 设置贸易站产物
-        trading_products = []
-        for product, count in product_requirements['trading_stations'].items():
-            trading_products.extend([product] * count)
-        for i, workplace in enumerate(self.workplaces['trading_stations']):
-            workplace.current_product = trading_products[i] if i < len(trading_products) else ""
-
-        # 设置制造站产物
-        manufacturing_products = []
-        for product, count in product_requirements['manufacturing_stations'].items():
-            manufacturing_products.extend([product] * count)
-        for i, workplace in enumerate(self.workplaces['manufacturing_stations']):
-            workplace.current_product = manufacturing_products[i] if i < len(manufacturing_products) else ""
+        # 设置贸易站、制造站产物
+        self.assign_products(self.workplaces['trading_stations'], product_requirements['trading_stations'])
+        self.assign_products(self.workplaces['manufacturing_stations'], product_requirements['manufacturing_stations'])
 
         results = {
             "title": "优化换班方案",
@@ -807,29 +821,18 @@ class WorkplaceOptimizer:
             "plans": []
         }
 
-        # 全局跟踪干员使用次数（最多2班，除菲亚梅塔目标可3班）
+        # 全局跟踪干员使用次数（最多2班，除菲亚梅塔目标可3班），预先包含所有已拥有干员以便直接下标访问
         operator_usage = {op.name: 0 for op in self.get_available_operators()}
 
         for shift in range(3):  # 3班
             current_target = self.fiammetta_targets[
                 shift % len(self.fiammetta_targets)] if self.fiammetta_targets else ""
 
-            plan = {
-                "name": f"第{shift + 1}班",
-                "description": f"自动优化第{shift + 1}班",
-                "description_post": "",
-                "Fiammetta": {"enable": fiammetta_enable, "target": current_target, "order": "pre"},  # 每个班次设置不同目标
-                "rooms": {
-                    "trading": [],
-                    "manufacture": [],
-                    "control": [{"operators": []}],  # 初始化为空
-                    "power": [],
-                    "meeting": [{"autofill": True}],
-                    "hire": [{"operators": []}],
-                    "dormitory": [{"autofill": True} for _ in range(4)],  # 初始化为自动填充
-                    "processing": [{"operators": []}],
-                }
-            }
+            plan = copy.deepcopy(_PLAN_TEMPLATE)
+            plan["name"] = f"第{shift + 1}班"
+            plan["description"] = f"自动优化第{shift + 1}班"
+            plan["Fiammetta"]["enable"] = fiammetta_enable
+            plan["Fiammetta"]["target"] = current_target  # 每个班次设置不同目标
             # 班次内干员使用跟踪，防止同一班重复分配
             shift_used_names = set()
             # 班次内控制中枢干员集合（去重）
@@ -846,18 +849,9 @@ class WorkplaceOptimizer:
                     "product": workplace.current_product  # 新增产物字段
                 }
                 plan["rooms"]["trading"].append(room)
-                # 添加控制中枢需求干员
-                for req in result.control_center_requirements:
-                    if req.operator not in shift_used_names and operator_usage.get(req.operator, 0) < 2:
-                        control_operators.add(req.operator)
-                        shift_used_names.add(req.operator)
-                        operator_usage[req.operator] += 1
-                # 添加宿舍需求干员
-                for req in result.dormitory_requirements:
-                    if req.operator not in shift_used_names and operator_usage.get(req.operator, 0) < 2:
-                        dormitory_operators.add(req.operator)
-                        shift_used_names.add(req.operator)
-                        operator_usage[req.operator] += 1
+                # 添加控制中枢、宿舍需求干员
+                self.absorb_room_requirements(result, operator_usage, shift_used_names,
+                                              control_operators, dormitory_operators)
 
             # 优化制造站
             for workplace in self.workplaces['manufacturing_stations']:
@@ -868,18 +862,9 @@ class WorkplaceOptimizer:
                     "product": workplace.current_product  # 新增产物字段
                 }
                 plan["rooms"]["manufacture"].append(room)
-                # 添加控制中枢需求干员
-                for req in result.control_center_requirements:
-                    if req.operator not in shift_used_names and operator_usage.get(req.operator, 0) < 2:
-                        control_operators.add(req.operator)
-                        shift_used_names.add(req.operator)
-                        operator_usage[req.operator] += 1
-                # 添加宿舍需求干员
-                for req in result.dormitory_requirements:
-                    if req.operator not in shift_used_names and operator_usage.get(req.operator, 0) < 2:
-                        dormitory_operators.add(req.operator)
-                        shift_used_names.add(req.operator)
-                        operator_usage[req.operator] += 1
+                # 添加控制中枢、宿舍需求干员
+                self.absorb_room_requirements(result, operator_usage, shift_used_names,
+                                              control_operators, dormitory_operators)
 
             # 分配控制中枢干员
             plan["rooms"]["control"][0]["operators"] = list(control_operators)
@@ -915,25 +900,22 @@ class WorkplaceOptimizer:
         candidates = ['巫恋', '龙舌兰', '但书']
         selected = []
         for candidate in candidates:
-            if candidate in self.operators and self.operators[candidate].own and self.operators[candidate].elite >= 2:
+            if self._owned_elite.get(candidate, -1) >= 2:
                 selected.append(candidate)
                 if len(selected) >= 3:
                     return selected
 
         # 如果不足3个，选择贸易站效率最高的干员（基于规则中的出现和效率）
-        trading_rules = [r for r in self.efficiency_rules if r.workplace_type == 'trading_station']
+        trading_rules = self.rules_by_type.get('trading_station', [])
         op_scores = {}
         for rule in trading_rules:
             for op in rule.operators:
-                if op in self.operators and self.operators[op].own and self.operators[
-                    op].elite >= 2 and op not in selected:
+                if self._owned_elite.get(op, -1) >= 2 and op not in selected:
                     score = rule.synergy_efficiency / len(rule.operators)  # 平均贡献
                     op_scores[op] = op_scores.get(op, 0) + score
-        sorted_ops = sorted(op_scores, key=op_scores.get, reverse=True)
-        for op in sorted_ops:
-            selected.append(op)
-            if len(selected) >= 3:
-                break
+        # 只需补足到3个，取得分最高的若干个即可（同分时保持先出现者优先，与完整排序一致）
+        top = heapq.nlargest(3 - len(selected), op_scores.items(), key=itemgetter(1))
+        selected.extend(op for op, _ in top)
         return selected
 
     def display_optimal_assignments(self, assignments):
@@ -1002,6 +984,16 @@ class WorkplaceOptimizer:
             cc = ','.join([f"{r.operator}(精{r.elite_required})" for r in rule.requires_control_center])
             print(
                 f"  [{i + 1}] {rule.description} | 类型: {rule.workplace_type} | 干员: {', '.join(rule.operators)} | 协同: {rule.synergy_efficiency}% | 中枢: {cc} | 精英要求: {rule.elite_requirements}")
+        for workplace_type, rules in self.rules_by_type.items():
+            products = {''}
+            for rule in rules:
+                products.update(rule.products)
+            for product in sorted(products):
+                total = len(self.get_rules_for_product(workplace_type, product))
+                kept = len(self.get_rules_by_slot_efficiency(workplace_type, product))
+                if total:
+                    print(f"DEBUG: {workplace_type}/{product or '任意产物'} 支配规则剪枝: "
+                          f"{total} -> {kept}（剪去 {(total - kept) / total:.0%}）")
 
     def print_workplaces(self):
         ts = self.workplaces.get('trading_stations', [])
@@ -1019,7 +1011,11 @@ if __name__ == "__main__":
     optimizer.display_optimal_assignments(optimal_assignments)
 
     # 保存最优分配结果
-    with open('optimal_assignments.json', 'w', encoding='utf-8') as f:
-        json.dump(optimal_assignments, f, ensure_ascii=False, indent=2)
+    if orjson is not None:
+        with open('optimal_assignments.json', 'wb') as f:
+            f.write(orjson.dumps(optimal_assignments, option=orjson.OPT_INDENT_2))
+    else:
+        with open('optimal_assignments.json', 'w', encoding='utf-8') as f:
+            json.dump(optimal_assignments, f, ensure_ascii=False, indent=2)
 
     print("最优分配方案已保存到 optimal_assignments.json")